@@ -97,23 +97,79 @@ export type OfflineDiagnosisInput = {
   language: string; // "en" | "hi" | "ta" | "te" | "bn"
 };
 
-// Call the local FastAPI service (ml/app.py -> /analyze).
+// Reads the NDJSON stream from ml/app.py -> /analyze/stream.
+// First line is the diagnosis itself, then one line per knowledge snippet
+// (in whatever order they finish translating, so keep them sorted by score).
+async function readDiagnosisStream(
+  body: ReadableStream<Uint8Array>,
+  onUpdate?: (partial: any) => void
+): Promise<any> {
+  const reader = body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  let result: any = null;
+
+  const handleLine = (line: string) => {
+    if (!line.trim()) return;
+    const { type, data } = JSON.parse(line);
+
+    if (type === "diagnosis") {
+      result = { ...data, knowledgeSnippets: [] };
+    } else if (type === "snippet" && result) {
+      result.knowledgeSnippets = [...result.knowledgeSnippets, data].sort(
+        (a: any, b: any) => (b.score ?? 0) - (a.score ?? 0)
+      );
+    }
+
+    if (result && onUpdate) {
+      onUpdate({ ...result, mode: "offline" });
+    }
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split("\n");
+    buffered = lines.pop() ?? "";
+    lines.forEach(handleLine);
+  }
+  handleLine(buffered + decoder.decode());
+
+  if (!result) {
+    throw new Error("Offline NLP API stream ended without a diagnosis");
+  }
+  return result;
+}
+
+// Call the local FastAPI service (ml/app.py -> /analyze/stream).
 // Adjust the URL/port if your uvicorn runs on a different one.
+// `onUpdate` (optional) gets the partial result as soon as the diagnosis
+// arrives and again after every knowledge snippet.
 export async function diagnoseOffline(
-  input: OfflineDiagnosisInput
+  input: OfflineDiagnosisInput,
+  onUpdate?: (partial: any) => void
 ): Promise<any> {
+  // Latest partial result, so a stream that breaks after the diagnosis
+  // line still returns what is already on screen
+  let partial: any = null;
+
   try {
-    const res = await fetch("http://localhost:8000/analyze", {
+    const res = await fetch("http://localhost:8000/analyze/stream", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify(input),
     });
 
-    if (!res.ok) {
+    if (!res.ok || !res.body) {
       throw new Error(`Offline NLP API returned status ${res.status}`);
     }
 
-    const data = await res.json();
+    const data = await readDiagnosisStream(res.body, (update) => {
+      partial = update;
+      onUpdate?.(update);
+    });
 
     // Tag response so UI can show correct toast
     if (!("mode" in data)) {
@@ -124,6 +180,10 @@ export async function diagnoseOffline(
   } catch (error) {
     console.error("Offline diagnosis call failed:", error);
 
+    if (partial) {
+      return partial;
+    }
+
     // Safe minimal fallback so the UI doesn't break completely
     return {
       mode: "offline",
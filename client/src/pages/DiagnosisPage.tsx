@@ -41,6 +41,7 @@ type KnowledgeSnippet = {
   title: string;
   content: string;
   source?: string;
+  score?: number;
 };
 
 type DiagnosisWithKnowledge = Diagnosis & {
@@ -83,7 +84,9 @@ export default function DiagnosisPage() {
     mutationFn: async (data: any) => {
       // If browser is offline, skip backend and use offline engine
       if (!isOnline()) {
-        const offlineResult = await diagnoseOffline(data);
+        const offlineResult = await diagnoseOffline(data, (partial) =>
+          setDiagnosisResult(partial as DiagnosisWithKnowledge)
+        );
         return offlineResult;
       }
 
@@ -93,7 +96,9 @@ export default function DiagnosisPage() {
         return result;
       } catch (error) {
         // If online diagnosis fails (500, network error, etc.), fall back to offline
-        const offlineResult = await diagnoseOffline(data);
+        const offlineResult = await diagnoseOffline(data, (partial) =>
+          setDiagnosisResult(partial as DiagnosisWithKnowledge)
+        );
         return offlineResult;
       }
     },
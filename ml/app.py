@@ -3,50 +3,162 @@
 from __future__ import annotations
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-from fastapi.responses import JSONResponse
-import json
+from typing import Callable, FrozenSet, List, Optional, Dict, Any, Tuple
+from fastapi.responses import JSONResponse, StreamingResponse
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+import asyncio
+import os
+import re
+import threading
 
-from biobert_rag import get_relevant_snippets
+import anyio
+import orjson
+
+from biobert_rag import get_relevant_snippets, register_keyword_vocabulary
+
+BASE_DIR = Path(__file__).resolve().parent
 
 # Try to import local translator
 try:
-    from hf_translator import translate_text as _hf_translate_text
+    from hf_translator import translate_batch as _hf_translate_batch
+    from hf_translator import SUPPORTED_LANGS as _TRANSLATION_LANGS
 except Exception as e:
-    _hf_translate_text = None
+    _hf_translate_batch = None
+    _TRANSLATION_LANGS = set()
     print("[Translator] hf_translator not available or import failed:", repr(e))
 
-
-def translate_text(text: str, target_lang: str) -> str:
+# Optional on-disk translation cache (pip install diskcache)
+try:
+    import diskcache
+
+    _tx_disk = diskcache.Cache(str(BASE_DIR / "tx_cache"))
+except Exception:
+    _tx_disk = None
+
+
+# --------------- TRANSLATION CACHE ---------------
+
+# Most strings we translate are fixed templates shared by every request, so
+# translations are memoised per (text, target_lang) across requests in a
+# bounded LRU, and persisted via diskcache (if installed) for warm restarts.
+_TX_CACHE_MAXSIZE = 4096
+_tx_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+_tx_cache_lock = threading.Lock()
+
+
+def _tx_cache_get(text: str, target_lang: str) -> Optional[str]:
+    key = (text, target_lang)
+    with _tx_cache_lock:
+        if key in _tx_cache:
+            _tx_cache.move_to_end(key)
+            return _tx_cache[key]
+
+    if _tx_disk is not None:
+        try:
+            hit = _tx_disk.get(key)
+        except Exception as e:
+            # Treat a broken/locked disk cache as a miss
+            print("[Translator] Could not read translation cache:", repr(e))
+            return None
+        if hit is not None:
+            _tx_cache_put(text, target_lang, hit, persist=False)
+        return hit
+    return None
+
+
+def _tx_cache_put(
+    text: str, target_lang: str, translated: str, persist: bool = True
+) -> None:
+    # Results identical to the input usually mean the model was missing or
+    # failed; don't remember those so they are retried later.
+    if translated == text:
+        return
+
+    key = (text, target_lang)
+    with _tx_cache_lock:
+        _tx_cache[key] = translated
+        _tx_cache.move_to_end(key)
+        while len(_tx_cache) > _TX_CACHE_MAXSIZE:
+            _tx_cache.popitem(last=False)
+
+    if persist and _tx_disk is not None:
+        try:
+            _tx_disk.set(key, translated)
+        except Exception as e:
+            print("[Translator] Could not persist translation:", repr(e))
+
+
+def translate_many(strings: List[str], target_lang: str) -> Dict[str, str]:
     """
-    Wrapper around hf_translator.translate_text(text, src_lang, tgt_lang).
+    Translate a collection of (possibly repeated) strings from English.
 
-    All reasoning in this service is done in ENGLISH, so:
-      - src_lang is always "en"
-      - tgt_lang is the UI language (hi/ta/te/bn)
-
-    If translator is missing or target_lang == "en", we just return the original text.
+    Cached strings are served from the translation cache; each remaining
+    unique string goes through the model exactly once, all in a single
+    batched generate() call. Returns {original: translated}; on any problem
+    strings simply map to themselves.
     """
-    if not text:
-        return text
-    if target_lang == "en":
-        return text
-    if _hf_translate_text is None:
-        return text
+    unique = list(dict.fromkeys(s for s in strings if s))
+    if not unique or target_lang == "en" or _hf_translate_batch is None:
+        return {s: s for s in unique}
+
+    result: Dict[str, str] = {}
+    misses: List[str] = []
+    for s in unique:
+        cached = _tx_cache_get(s, target_lang)
+        if cached is None:
+            misses.append(s)
+        else:
+            result[s] = cached
+
+    if not misses:
+        return result
 
     try:
-        # Source language is always English
-        return _hf_translate_text(text, "en", target_lang)
+        translated = _hf_translate_batch(misses, "en", target_lang)
     except Exception as e:
-        print("[Translator] Error translating text:", repr(e))
-        return text
+        print("[Translator] Error translating texts:", repr(e))
+        translated = misses
+
+    for s, t in zip(misses, translated):
+        result[s] = t
+        _tx_cache_put(s, target_lang, t)
+    return result
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (several times faster than stdlib json)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+def _model_to_dict(model: BaseModel) -> Dict[str, Any]:
+    """JSON-safe dict of a Pydantic model without a JSON encode/decode round-trip."""
+    if hasattr(model, "model_dump"):
+        return model.model_dump(mode="json")  # Pydantic v2
+    return model.dict()  # Pydantic v1
+
+
+# Worker threads for the blocking BioBERT / translation calls in /analyze
+THREADPOOL_SIZE = 40
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    _start_translation_preload()
+    yield
 
 
 app = FastAPI(
     title="MedAssist NLP Service",
-    default_response_class=JSONResponse,
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 # --------------- CORS CONFIG ---------------
@@ -60,10 +172,11 @@ origins = [
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,      # for dev you can use ["*"] if you want
+    allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=3600,  # let browsers cache preflight responses for an hour
 )
 
 # --------------- MODELS ---------------
@@ -107,12 +220,21 @@ class TreatmentProtocol(BaseModel):
     lifestyle: Optional[List[str]] = None
 
 
+class KnowledgeSnippet(BaseModel):
+    id: str
+    title: str
+    content: str
+    source: Optional[str] = None
+    score: float
+
+
 class DiagnosisResponse(BaseModel):
     primaryDiagnosis: str
     differentialDiagnoses: List[DifferentialDiagnosis]
     treatmentProtocol: Optional[TreatmentProtocol] = None
     requiresReferral: bool = False
     referralReason: Optional[str] = None
+    knowledgeSnippets: List[KnowledgeSnippet] = []
 
 
 # --------------- SYMPTOM NORMALISATION ---------------
@@ -241,24 +363,35 @@ SYMPTOM_NORMALIZATION: Dict[str, Dict[str, str]] = {
 }
 
 
-def normalize_symptom(symptom: str, language: str) -> str:
-    """Map a visible symptom label into a canonical English key."""
-    s = symptom.strip().lower()
-    lang_map = SYMPTOM_NORMALIZATION.get(language, {})
-    if s in lang_map:
-        return lang_map[s]
+# LANGUAGE → {label: canonical key}, each merged over the English map so a
+# single dict lookup covers both the language and the English fallback.
+_NORMALIZE_FLAT: Dict[str, Dict[str, str]] = {
+    lang: {**SYMPTOM_NORMALIZATION["en"], **mapping}
+    for lang, mapping in SYMPTOM_NORMALIZATION.items()
+}
 
-    # Fallback: try English map
-    en_map = SYMPTOM_NORMALIZATION["en"]
-    if s in en_map:
-        return en_map[s]
 
+def _normalize_in(table: Dict[str, str], symptom: str) -> str:
+    s = symptom.strip()
+    # UI labels arrive exactly as listed (and Indic scripts have no case),
+    # so the exact label almost always hits before we pay for .lower().
+    hit = table.get(s)
+    if hit is not None:
+        return hit
+    s = s.lower()
     # Unknown – just return lowercased string so we still show *something*
-    return s
+    return table.get(s, s)
+
+
+def normalize_symptom(symptom: str, language: str) -> str:
+    """Map a visible symptom label into a canonical English key."""
+    table = _NORMALIZE_FLAT.get(language, _NORMALIZE_FLAT["en"])
+    return _normalize_in(table, symptom)
 
 
 def normalize_symptoms(symptoms: List[str], language: str) -> List[str]:
-    return [normalize_symptom(s, language) for s in symptoms]
+    table = _NORMALIZE_FLAT.get(language, _NORMALIZE_FLAT["en"])
+    return [_normalize_in(table, s) for s in symptoms]
 
 
 # --------------- SIMPLE RULES (on canonical symptoms) ---------------
@@ -276,25 +409,51 @@ SYMPTOM_TO_PRIMARY: Dict[str, str] = {
     "dizziness": "Non-specific dizziness / presyncope",
 }
 
+# Let the RAG keyword fallback precompute matches for the terms we query with
+register_keyword_vocabulary(CANONICAL_SYMPTOMS + list(SYMPTOM_TO_PRIMARY.values()))
+
+
+# The rule builders below take canonical keys from normalize_symptoms, which
+# are already lowercase, so they match against them without re-lowercasing.
+
 
 def infer_primary(canonical_symptoms: List[str]) -> str:
     for s in canonical_symptoms:
-        key = s.lower()
-        if key in SYMPTOM_TO_PRIMARY:
-            return SYMPTOM_TO_PRIMARY[key]
+        if s in SYMPTOM_TO_PRIMARY:
+            return SYMPTOM_TO_PRIMARY[s]
     if canonical_symptoms:
         return f"Non-specific illness ({canonical_symptoms[0]})"
     return "Non-specific illness"
 
 
+# "120/80", "120 / 80", ...
+_BP_RE = re.compile(r"\s*(\d+)\s*/\s*(\d+)\s*")
+
+
 def parse_bp(bp_str: Optional[str]):
     if not bp_str:
         return None
-    try:
-        s, d = bp_str.replace(" ", "").split("/")
-        return int(s), int(d)
-    except Exception:
-        return None
+    m = _BP_RE.fullmatch(bp_str)
+    return (int(m[1]), int(m[2])) if m else None
+
+
+def _has_low_bp(v: VitalSigns) -> bool:
+    bp = parse_bp(v.bloodPressure)
+    return bp is not None and (bp[0] < 90 or bp[1] < 60)
+
+
+# (predicate on vital signs, referral reason) – checked in order, first hit wins
+_RED_FLAG_RULES: List[Tuple[Callable[[VitalSigns], bool], str]] = [
+    (
+        lambda v: bool(v.temperature) and v.temperature >= 103,
+        "High fever – urgent evaluation needed.",
+    ),
+    (
+        lambda v: v.oxygenSaturation is not None and v.oxygenSaturation < 90,
+        "Low oxygen saturation – risk of respiratory distress.",
+    ),
+    (_has_low_bp, "Very low blood pressure – risk of shock."),
+]
 
 
 def check_red_flags(req: DiagnosisRequest):
@@ -302,27 +461,17 @@ def check_red_flags(req: DiagnosisRequest):
     if not v:
         return False, None
 
-    if v.temperature and v.temperature >= 103:
-        return True, "High fever – urgent evaluation needed."
-
-    if v.oxygenSaturation is not None and v.oxygenSaturation < 90:
-        return True, "Low oxygen saturation – risk of respiratory distress."
-
-    bp = parse_bp(v.bloodPressure)
-    if bp:
-        sys, dia = bp
-        if sys < 90 or dia < 60:
-            return True, "Very low blood pressure – risk of shock."
+    for predicate, reason in _RED_FLAG_RULES:
+        if predicate(v):
+            return True, reason
 
     return False, None
 
 
 def build_differentials(
-    primary: str, canonical_symptoms: List[str]
+    primary: str, canonical_set: FrozenSet[str]
 ) -> List[DifferentialDiagnosis]:
-    lower = [s.lower() for s in canonical_symptoms]
-
-    if "fever" in lower:
+    if "fever" in canonical_set:
         return [
             DifferentialDiagnosis(
                 condition="Viral infection",
@@ -351,15 +500,13 @@ def build_differentials(
 
 
 def build_treatment(
-    canonical_symptoms: List[str], red_flag: bool
+    canonical_set: FrozenSet[str], red_flag: bool
 ) -> TreatmentProtocol:
     meds: List[TreatmentMed] = []
     procedures: List[str] = []
     lifestyle: List[str] = []
 
-    lower = [s.lower() for s in canonical_symptoms]
-
-    if "fever" in lower:
+    if "fever" in canonical_set:
         meds.append(
             TreatmentMed(
                 name="Paracetamol (generic)",
@@ -371,10 +518,10 @@ def build_treatment(
         lifestyle.append("Encourage oral fluids and light clothing.")
         lifestyle.append("Advise rest and light diet.")
 
-    if "cough" in lower:
+    if "cough" in canonical_set:
         lifestyle.append("Avoid smoke/irritants; warm fluids can help.")
 
-    if "diarrhea" in lower:
+    if "diarrhea" in canonical_set:
         lifestyle.append("Use oral rehydration solution as per local protocol.")
         lifestyle.append("Watch for signs of dehydration.")
 
@@ -392,6 +539,117 @@ def build_treatment(
     )
 
 
+def _map_user_text(base: Dict[str, Any], fn: Callable[[str], str]) -> None:
+    """
+    Apply `fn` to every user-facing string of an /analyze response (in place).
+    Used to collect the strings to translate and then to substitute them.
+    """
+    base["primaryDiagnosis"] = fn(base.get("primaryDiagnosis", ""))
+
+    # differential diagnoses
+    for d in base.get("differentialDiagnoses", []):
+        d["condition"] = fn(d.get("condition", ""))
+        if d.get("reasoning"):
+            d["reasoning"] = fn(d["reasoning"])
+
+    # referral reason
+    if base.get("referralReason"):
+        base["referralReason"] = fn(base["referralReason"])
+
+    # treatment protocol
+    tp = base.get("treatmentProtocol")
+    if tp:
+        for m in tp.get("medications") or []:
+            m["name"] = fn(m.get("name", ""))
+            m["dosage"] = fn(m.get("dosage", ""))
+            m["frequency"] = fn(m.get("frequency", ""))
+            m["duration"] = fn(m.get("duration", ""))
+
+        tp["procedures"] = [fn(p) for p in tp.get("procedures") or []] or None
+        tp["lifestyle"] = [fn(l) for l in tp.get("lifestyle") or []] or None
+
+    # knowledge snippets
+    for snip in base.get("knowledgeSnippets", []):
+        _map_snippet_text(snip, fn)
+
+
+def _map_snippet_text(snip: Dict[str, Any], fn: Callable[[str], str]) -> None:
+    """Same as _map_user_text, for a single knowledge snippet."""
+    snip["title"] = fn(snip.get("title", ""))
+    snip["content"] = fn(snip.get("content", ""))
+    if snip.get("source"):
+        snip["source"] = fn(snip["source"])
+
+
+async def _translate_in_place(
+    obj: Dict[str, Any],
+    mapper: Callable[[Dict[str, Any], Callable[[str], str]], None],
+    target_lang: str,
+) -> None:
+    """
+    Translate the user-facing strings `mapper` visits in `obj`: collect them,
+    translate the unique ones in one batch (in the threadpool), substitute.
+    """
+    if target_lang == "en":
+        return
+
+    strings: List[str] = []
+
+    def _collect(text: str) -> str:
+        strings.append(text)
+        return text
+
+    mapper(obj, _collect)
+    translations = await run_in_threadpool(translate_many, strings, target_lang)
+    mapper(obj, lambda text: translations.get(text, text))
+
+
+def _boilerplate_strings() -> List[str]:
+    """
+    The fixed English strings the rules above can produce (canonical symptoms,
+    primary diagnoses, red-flag reasons, differential reasonings, treatment
+    advice).
+    """
+    strings: List[str] = list(CANONICAL_SYMPTOMS)
+    strings.extend(SYMPTOM_TO_PRIMARY.values())
+    strings.extend(reason for _, reason in _RED_FLAG_RULES)
+
+    def _collect(text: str) -> str:
+        strings.append(text)
+        return text
+
+    for symptom in CANONICAL_SYMPTOMS:
+        primary = infer_primary([symptom])
+        response = DiagnosisResponse(
+            primaryDiagnosis=primary,
+            differentialDiagnoses=build_differentials(primary, frozenset([symptom])),
+            treatmentProtocol=build_treatment(frozenset([symptom]), red_flag=True),
+        )
+        _map_user_text(_model_to_dict(response), _collect)
+
+    return list(dict.fromkeys(strings))
+
+
+def _preload_translations() -> None:
+    strings = _boilerplate_strings()
+    for lang in sorted(_TRANSLATION_LANGS - {"en"}):
+        translate_many(strings, lang)
+    print(f"[Translator] Preloaded {len(strings)} strings per language.")
+
+
+def _start_translation_preload() -> None:
+    """
+    Warm the translation cache in the background so the boilerplate of the
+    first requests is already a cache lookup. Disable with
+    MEDASSIST_PRELOAD_TRANSLATIONS=0.
+    """
+    if _hf_translate_batch is None:
+        return
+    if os.environ.get("MEDASSIST_PRELOAD_TRANSLATIONS", "1") == "0":
+        return
+    threading.Thread(target=_preload_translations, daemon=True).start()
+
+
 # --------------- HEALTH CHECK ---------------
 
 
@@ -403,6 +661,63 @@ async def health_check() -> Dict[str, Any]:
 # --------------- MAIN NLP + RAG ENDPOINT ---------------
 
 
+def _english_diagnosis(req: DiagnosisRequest) -> Tuple[Dict[str, Any], List[str], str]:
+    """
+    Rule-based part of /analyze, in English.
+    Returns (response dict without snippets, canonical symptoms, primary dx).
+    """
+    # We require structured symptoms from the UI
+    if not req.symptoms or len(req.symptoms) == 0:
+        raise ValueError("No symptoms provided; please select from the list.")
+
+    # Normalise from visible labels → canonical English
+    canonical_symptoms = normalize_symptoms(req.symptoms, req.language)
+
+    canonical_set = frozenset(canonical_symptoms)
+    primary = infer_primary(canonical_symptoms)
+    red_flag, reason = check_red_flags(req)
+    diffs = build_differentials(primary, canonical_set)
+    treatment = build_treatment(canonical_set, red_flag)
+
+    response = DiagnosisResponse(
+        primaryDiagnosis=primary,
+        differentialDiagnoses=diffs,
+        treatmentProtocol=treatment,
+        requiresReferral=red_flag,
+        referralReason=reason,
+    )
+    return _model_to_dict(response), canonical_symptoms, primary
+
+
+def _fallback_response(e: Exception) -> Dict[str, Any]:
+    """Graceful error response (still matching the schema)."""
+    fallback = DiagnosisResponse(
+        primaryDiagnosis="NLP processing error",
+        differentialDiagnoses=[
+            DifferentialDiagnosis(
+                condition="Unknown",
+                confidence=100,
+                reasoning=str(e),
+            )
+        ],
+        treatmentProtocol=None,
+        requiresReferral=False,
+        referralReason=None,
+    )
+    return _model_to_dict(fallback)
+
+
+def _rag_snippets(canonical_symptoms: List[str], primary: str):
+    # Torch forward pass – run in the threadpool, not on the event loop
+    return run_in_threadpool(
+        get_relevant_snippets,
+        symptoms=canonical_symptoms,
+        primary_diagnosis=primary,
+        top_k=3,
+        min_score=0.2,
+    )
+
+
 @app.post("/analyze", response_model=DiagnosisResponse)
 async def analyze(req: DiagnosisRequest):
     """
@@ -417,117 +732,76 @@ async def analyze(req: DiagnosisRequest):
     """
 
     try:
-        # 1) We require structured symptoms from the UI
-        if not req.symptoms or len(req.symptoms) == 0:
-            raise ValueError("No symptoms provided; please select from the list.")
-
-        # Normalise from visible labels → canonical English
-        canonical_symptoms = normalize_symptoms(req.symptoms, req.language)
-
-        # 2) Core reasoning in English
-        primary = infer_primary(canonical_symptoms)
-        red_flag, reason = check_red_flags(req)
-        diffs = build_differentials(primary, canonical_symptoms)
-        treatment = build_treatment(canonical_symptoms, red_flag)
+        # 1) + 2) Core reasoning in English
+        base, canonical_symptoms, primary = _english_diagnosis(req)
 
         # 3) BioBERT RAG on canonical English symptoms
-        rag_snippets = get_relevant_snippets(
-            symptoms=canonical_symptoms,
-            primary_diagnosis=primary,
-            top_k=3,
-            min_score=0.2,
-        )
-
-        # 4) Build base response (initially English)
-        response = DiagnosisResponse(
-            primaryDiagnosis=primary,
-            differentialDiagnoses=diffs,
-            treatmentProtocol=treatment,
-            requiresReferral=red_flag,
-            referralReason=reason,
-        )
+        base["knowledgeSnippets"] = await _rag_snippets(canonical_symptoms, primary)
 
-        base: Dict[str, Any] = json.loads(response.json())
-        base["knowledgeSnippets"] = rag_snippets
+        # 4) Translate all user-facing text if needed
+        await _translate_in_place(base, _map_user_text, req.language or "en")
 
-        # 5) Translate all user-facing text if needed
-        target_lang = req.language or "en"
-        if target_lang != "en":
-            # primary diagnosis
-            base["primaryDiagnosis"] = translate_text(
-                base.get("primaryDiagnosis", ""), target_lang
-            )
-
-            # differential diagnoses
-            for d in base.get("differentialDiagnoses", []):
-                d["condition"] = translate_text(d.get("condition", ""), target_lang)
-                if d.get("reasoning"):
-                    d["reasoning"] = translate_text(d["reasoning"], target_lang)
-
-            # referral reason
-            if base.get("referralReason"):
-                base["referralReason"] = translate_text(
-                    base["referralReason"], target_lang
-                )
-
-            # treatment protocol
-            tp = base.get("treatmentProtocol")
-            if tp:
-                meds = tp.get("medications") or []
-                for m in meds:
-                    m["name"] = translate_text(m.get("name", ""), target_lang)
-                    m["dosage"] = translate_text(m.get("dosage", ""), target_lang)
-                    m["frequency"] = translate_text(
-                        m.get("frequency", ""), target_lang
-                    )
-                    m["duration"] = translate_text(m.get("duration", ""), target_lang)
-
-                procedures = tp.get("procedures") or []
-                tp["procedures"] = [
-                    translate_text(p, target_lang) for p in procedures
-                ] or None
-
-                lifestyle = tp.get("lifestyle") or []
-                tp["lifestyle"] = [
-                    translate_text(l, target_lang) for l in lifestyle
-                ] or None
-
-            # knowledge snippets
-            for snip in base.get("knowledgeSnippets", []):
-                snip["title"] = translate_text(snip.get("title", ""), target_lang)
-                snip["content"] = translate_text(
-                    snip.get("content", ""), target_lang
-                )
-                if snip.get("source"):
-                    snip["source"] = translate_text(
-                        snip.get("source", ""), target_lang
-                    )
-
-        return JSONResponse(
-            content=base, status_code=200, media_type="application/json"
-        )
+        return base
 
     except Exception as e:
         # Log and return a graceful fallback (still matching schema)
         print("NLP Error in /analyze:", repr(e))
+        return _fallback_response(e)
 
-        fallback = DiagnosisResponse(
-            primaryDiagnosis="NLP processing error",
-            differentialDiagnoses=[
-                DifferentialDiagnosis(
-                    condition="Unknown",
-                    confidence=100,
-                    reasoning=str(e),
-                )
-            ],
-            treatmentProtocol=None,
-            requiresReferral=False,
-            referralReason=None,
-        )
 
-        base = json.loads(fallback.json())
-        base["knowledgeSnippets"] = []
+def _ndjson(kind: str, data: Dict[str, Any]) -> bytes:
+    return orjson.dumps({"type": kind, "data": data}) + b"\n"
 
-        return JSONResponse(
-            content=base, status_code=200, media_type="application/json"
-        )
+
+@app.post("/analyze/stream")
+async def analyze_stream(req: DiagnosisRequest):
+    """
+    Streaming variant of /analyze (NDJSON, one JSON object per line):
+
+      {"type": "diagnosis", "data": {...}}  primary, differentials, treatment,
+                                            referral (knowledgeSnippets empty)
+      {"type": "snippet", "data": {...}}    one per knowledge snippet
+
+    The diagnosis line is sent as soon as the rules have run, without waiting
+    for retrieval; snippets follow as each one finishes translating, so they
+    arrive in completion order – sort by `score` on the client.
+    """
+    target_lang = req.language or "en"
+
+    async def _translated_snippet(snip: Dict[str, Any]) -> Dict[str, Any]:
+        await _translate_in_place(snip, _map_snippet_text, target_lang)
+        return snip
+
+    async def gen():
+        rag_task = None
+        tasks: List["asyncio.Future[Dict[str, Any]]"] = []
+        sent_diagnosis = False
+        try:
+            base, canonical_symptoms, primary = _english_diagnosis(req)
+
+            # Retrieval runs while the diagnosis itself is being translated
+            rag_task = asyncio.ensure_future(
+                _rag_snippets(canonical_symptoms, primary)
+            )
+            await _translate_in_place(base, _map_user_text, target_lang)
+            yield _ndjson("diagnosis", base)
+            sent_diagnosis = True
+
+            tasks = [
+                asyncio.ensure_future(_translated_snippet(snip))
+                for snip in await rag_task
+            ]
+            for next_done in asyncio.as_completed(tasks):
+                yield _ndjson("snippet", await next_done)
+        except Exception as e:
+            print("NLP Error in /analyze/stream:", repr(e))
+            # Same graceful fallback as /analyze, unless the client already
+            # has the diagnosis (then the stream just ends early)
+            if not sent_diagnosis:
+                yield _ndjson("diagnosis", _fallback_response(e))
+        finally:
+            for task in [rag_task, *tasks]:
+                if task is not None:
+                    task.cancel()
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
@@ -2,27 +2,71 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
 import os
+import platform
+import threading
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, FrozenSet, Iterable, Optional, Tuple
 
+import numpy as np
 import torch
-from transformers import AutoTokenizer, AutoModel
+import torch.nn.functional as F
+from transformers import AutoTokenizer, AutoModel, BertTokenizerFast
+
+# Optional: Aho-Corasick automaton for keyword matching (pip install pyahocorasick)
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 
 # Path to the knowledge base JSON (same folder as this file)
 BASE_DIR = Path(__file__).resolve().parent
 KB_PATH = BASE_DIR / "knowledge_base.json"
 
+# On-disk cache of the document embeddings for the knowledge base
+KB_EMBEDDINGS_PATH = BASE_DIR / "kb_embeddings.pt"
+
 # Name of the BioBERT model
 BIOBERT_MODEL_NAME = "dmis-lab/biobert-base-cased-v1.1"
 
+# Optional small encoder for retrieval (22M params, 384-d vs BioBERT's 110M).
+# Set MEDASSIST_FAST_QUERY_ENCODER=1 to use it when it is in the local cache;
+# BioBERT is used otherwise.
+FAST_QUERY_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+_FAST_QUERY_ENCODER = os.environ.get("MEDASSIST_FAST_QUERY_ENCODER") == "1"
+
+# Set MEDASSIST_QUANTIZE=1 to run BioBERT with dynamic INT8 Linear layers on CPU
+_QUANTIZE = os.environ.get("MEDASSIST_QUANTIZE") == "1"
+
+# Set MEDASSIST_TORCH_COMPILE=1 to run the encoder through torch.compile
+# (PyTorch 2.x). The first requests pay the compilation cost.
+_TORCH_COMPILE = os.environ.get("MEDASSIST_TORCH_COMPILE") == "1"
+
+# BioBERT runs in FP16 on the GPU when there is one, otherwise on CPU
+_device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
 _tokenizer = None
 _model = None
+_encoder_name = BIOBERT_MODEL_NAME  # model actually loaded into _model
+_forward = None  # _model, or its torch.compile'd wrapper
 _BIOBERT_AVAILABLE = False
 _BIOBERT_ERROR = None
 
+# (N_docs, hidden_dim) matrix of L2-normalised document embeddings.
+# Built once (or loaded from KB_EMBEDDINGS_PATH) the first time it is needed.
+_DOC_MATRIX: Optional[torch.Tensor] = None
+
+# Serialises the lazy model load / embedding precompute, since
+# get_relevant_snippets is called from several worker threads at once.
+_INIT_LOCK = threading.Lock()
+
+# Documents per forward pass when building _DOC_MATRIX (bounds peak memory)
+_ENCODE_BATCH_SIZE = 32
+
 
 def _load_knowledge_base() -> List[Dict[str, Any]]:
     if not KB_PATH.exists():
@@ -44,80 +88,292 @@ def _load_knowledge_base() -> List[Dict[str, Any]]:
 _KB_DOCS = _load_knowledge_base()
 
 
+def _doc_text(doc: Dict[str, Any]) -> str:
+    content = str(doc.get("content") or doc.get("text") or "")
+    title = str(doc.get("title") or "")
+    return f"{title}. {content}"
+
+
+# Lowercased document texts for the keyword fallback (computed once)
+_KB_LOWER: List[str] = [_doc_text(doc).lower() for doc in _KB_DOCS]
+
+# Keyword vocabulary (canonical symptoms / diagnoses) and, per KB document,
+# the vocabulary terms it contains. Filled by register_keyword_vocabulary().
+_KEYWORD_VOCAB: FrozenSet[str] = frozenset()
+_KB_KEYWORD_HITS: List[FrozenSet[str]] = []
+
+
+def register_keyword_vocabulary(terms: Iterable[str]) -> None:
+    """
+    Precomputes which of `terms` occur in each KB document, so keyword
+    scoring of those terms becomes a set lookup instead of a substring scan
+    per query. With pyahocorasick installed each document is scanned once
+    for all terms.
+    """
+    global _KEYWORD_VOCAB, _KB_KEYWORD_HITS
+
+    vocab = frozenset(t.lower() for t in terms if t)
+    if ahocorasick is not None and vocab:
+        automaton = ahocorasick.Automaton()
+        for term in vocab:
+            automaton.add_word(term, term)
+        automaton.make_automaton()
+        hits = [
+            frozenset(term for _, term in automaton.iter(text))
+            for text in _KB_LOWER
+        ]
+    else:
+        hits = [frozenset(t for t in vocab if t in text) for text in _KB_LOWER]
+
+    _KB_KEYWORD_HITS = hits
+    _KEYWORD_VOCAB = vocab
+
+
+def _model_variant() -> str:
+    if _device.type == "cuda":
+        return "cuda-fp16"
+    return "cpu-int8" if _QUANTIZE else "cpu-fp32"
+
+
+def _kb_cache_key() -> str:
+    """
+    Hash of the knowledge base content + model variant. The embedding cache
+    on disk is only reused when this matches, so editing knowledge_base.json
+    (or switching model / device / quantization) rebuilds it automatically.
+    """
+    payload = json.dumps(
+        {"model": _encoder_name, "variant": _model_variant(), "docs": _KB_DOCS},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _quantize_model(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Dynamic INT8 quantization of all nn.Linear layers (the bulk of BERT's
+    FLOPs). Roughly halves memory and uses the CPU's INT8 dot-product path.
+    """
+    machine = platform.machine().lower()
+    engine = "qnnpack" if machine in ("arm64", "aarch64") else "fbgemm"
+    if engine in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = engine
+    torch.set_num_threads(os.cpu_count() or 1)
+
+    print(f"[BioBERT-RAG] Quantizing BioBERT to INT8 ({engine}).")
+    return torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def _load_fast_tokenizer(model_name: str):
+    """
+    BioBERT only ships vocab.txt, for which AutoTokenizer may hand back the
+    slow pure-Python tokenizer. Ask for (or build) the Rust-backed one.
+    """
+    try:
+        return AutoTokenizer.from_pretrained(
+            model_name, local_files_only=True, use_fast=True
+        )
+    except Exception as e:
+        print("[BioBERT-RAG] AutoTokenizer(use_fast=True) failed:", repr(e))
+        return BertTokenizerFast.from_pretrained(model_name, local_files_only=True)
+
+
+def _load_encoder(model_name: str):
+    tokenizer = _load_fast_tokenizer(model_name)
+    model = AutoModel.from_pretrained(model_name, local_files_only=True)
+    model.eval()
+    model.to(_device)
+    if _device.type == "cuda":
+        model = model.half()
+    elif _QUANTIZE:
+        model = _quantize_model(model)
+    return tokenizer, model
+
+
+def _compile_model(model: torch.nn.Module):
+    """
+    torch.compile the encoder to fuse kernels and drop per-op Python overhead.
+    Compilation is lazy, so failures surface on the first call (see _run_model).
+    """
+    try:
+        mode = "reduce-overhead" if _device.type == "cuda" else "default"
+        print(f"[BioBERT-RAG] Compiling encoder with torch.compile ({mode}).")
+        return torch.compile(model, mode=mode, dynamic=True)
+    except Exception as e:
+        print("[BioBERT-RAG] torch.compile unavailable, using eager model:", repr(e))
+        return model
+
+
+def _run_model(inputs: Dict[str, torch.Tensor]):
+    global _forward
+    try:
+        return _forward(**inputs)
+    except Exception as e:
+        if _forward is _model:
+            raise
+        # e.g. no Triton / C++ toolchain for the compiled graph
+        print("[BioBERT-RAG] Compiled encoder failed, using eager model:", repr(e))
+        _forward = _model
+        return _model(**inputs)
+
+
 def _try_load_biobert() -> None:
     """
     Tries to load BioBERT *only from local cache*.
     If not available, sets _BIOBERT_AVAILABLE=False and logs the error.
 
+    With MEDASSIST_FAST_QUERY_ENCODER=1 the small MiniLM encoder is tried
+    first, and BioBERT only if MiniLM is not cached locally.
+
     This avoids trying to hit huggingface.co when you are offline.
     """
-    global _tokenizer, _model, _BIOBERT_AVAILABLE, _BIOBERT_ERROR
+    global _tokenizer, _model, _forward, _encoder_name
+    global _BIOBERT_AVAILABLE, _BIOBERT_ERROR
 
     if _tokenizer is not None and _model is not None:
         _BIOBERT_AVAILABLE = True
         return
 
-    try:
-        print("[BioBERT-RAG] Trying to load BioBERT from local cache...")
-        _tokenizer = AutoTokenizer.from_pretrained(
-            BIOBERT_MODEL_NAME, local_files_only=True
-        )
-        _model = AutoModel.from_pretrained(
-            BIOBERT_MODEL_NAME, local_files_only=True
-        )
-        _model.eval()
-        _BIOBERT_AVAILABLE = True
-        _BIOBERT_ERROR = None
-        print("[BioBERT-RAG] BioBERT loaded successfully from local cache.")
-    except Exception as e:
-        _BIOBERT_AVAILABLE = False
-        _BIOBERT_ERROR = e
-        print(
-            "[BioBERT-RAG] Could not load BioBERT from local cache. "
-            "Falling back to simple keyword-based scoring.\n",
-            "Error:",
-            repr(e),
-        )
+    candidates = [BIOBERT_MODEL_NAME]
+    if _FAST_QUERY_ENCODER:
+        candidates.insert(0, FAST_QUERY_MODEL_NAME)
 
+    for model_name in candidates:
+        try:
+            print(f"[BioBERT-RAG] Trying to load {model_name} from local cache...")
+            _tokenizer, _model = _load_encoder(model_name)
+            _forward = _compile_model(_model) if _TORCH_COMPILE else _model
+            _encoder_name = model_name
+            _BIOBERT_AVAILABLE = True
+            _BIOBERT_ERROR = None
+            print(
+                f"[BioBERT-RAG] {model_name} loaded successfully from local cache "
+                f"({_model_variant()})."
+            )
+            return
+        except Exception as e:
+            _BIOBERT_AVAILABLE = False
+            _BIOBERT_ERROR = e
+            print(
+                f"[BioBERT-RAG] Could not load {model_name} from local cache.",
+                "Error:",
+                repr(e),
+            )
 
-def _encode_text(text: str) -> torch.Tensor:
-    inputs = _tokenizer(
-        text,
+    print("[BioBERT-RAG] Falling back to simple keyword-based scoring.")
+
+
+def _encode_texts(texts: List[str]) -> torch.Tensor:
+    """
+    Encodes a batch of texts in a single tokenizer + model call.
+    Returns mean-pooled embeddings of shape (N, hidden_dim).
+    """
+    encoded = _tokenizer(
+        texts,
         padding=True,
         truncation=True,
         max_length=256,
-        return_tensors="pt",
+        return_tensors="np",
+    )
+    inputs = {k: torch.from_numpy(v).to(_device) for k, v in encoded.items()}
+    autocast = (
+        torch.autocast(_device.type, dtype=torch.float16)
+        if _device.type == "cuda"
+        else nullcontext()
     )
-    with torch.no_grad():
-        outputs = _model(**inputs)
-    # mean-pool last hidden state
-    last_hidden = outputs.last_hidden_state  # (1, seq_len, hidden)
-    mask = inputs.attention_mask.unsqueeze(-1)  # (1, seq_len, 1)
+    with torch.inference_mode(), autocast:
+        outputs = _run_model(inputs)
+    # mean-pool last hidden state, ignoring padding
+    last_hidden = outputs.last_hidden_state.float()  # (N, seq_len, hidden)
+    mask = inputs["attention_mask"].unsqueeze(-1).float()  # (N, seq_len, 1)
     masked = last_hidden * mask
     summed = masked.sum(dim=1)
     counts = mask.sum(dim=1).clamp(min=1)
-    return (summed / counts).squeeze(0)  # (hidden_dim,)
+    # embeddings are always returned as FP32 on CPU (the cached KB matrix lives there)
+    return (summed / counts).cpu()  # (N, hidden_dim)
+
+
+def _encode_text(text: str) -> torch.Tensor:
+    return _encode_texts([text])[0]  # (hidden_dim,)
+
+
+def _precompute_doc_embeddings() -> None:
+    """
+    Encodes every KB document once and keeps the stacked, L2-normalised
+    vectors in _DOC_MATRIX. The result is persisted to KB_EMBEDDINGS_PATH so
+    a restart with an unchanged knowledge base skips the encoding entirely.
+    """
+    global _DOC_MATRIX
+
+    key = _kb_cache_key()
+
+    if KB_EMBEDDINGS_PATH.exists():
+        try:
+            cached = torch.load(KB_EMBEDDINGS_PATH, map_location="cpu")
+            if cached.get("key") == key:
+                _DOC_MATRIX = cached["matrix"]
+                print(
+                    f"[BioBERT-RAG] Loaded {_DOC_MATRIX.shape[0]} cached "
+                    "document embeddings."
+                )
+                return
+        except Exception as e:
+            print("[BioBERT-RAG] Ignoring unreadable embedding cache:", repr(e))
 
+    print(f"[BioBERT-RAG] Encoding {len(_KB_DOCS)} knowledge items...")
+    texts = [_doc_text(doc) for doc in _KB_DOCS]
+    chunks: List[torch.Tensor] = []
+    for start in range(0, len(texts), _ENCODE_BATCH_SIZE):
+        vecs = _encode_texts(texts[start : start + _ENCODE_BATCH_SIZE])
+        chunks.append(F.normalize(vecs, dim=1))
+    _DOC_MATRIX = torch.cat(chunks)
 
-def _cosine_similarity(a: torch.Tensor, b: torch.Tensor) -> float:
-    a_norm = a / (a.norm(p=2) + 1e-8)
-    b_norm = b / (b.norm(p=2) + 1e-8)
-    return float(torch.sum(a_norm * b_norm).item())
+    try:
+        torch.save({"key": key, "matrix": _DOC_MATRIX}, KB_EMBEDDINGS_PATH)
+    except Exception as e:
+        print("[BioBERT-RAG] Could not write embedding cache:", repr(e))
 
 
-def _simple_keyword_score(query_tokens: List[str], text: str) -> float:
+def _top_k_indices(sims: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Indices of the top_k largest similarities, best first. argpartition is
+    O(N), so only the k winners get sorted.
+    """
+    k = min(top_k, len(sims))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-sims, k - 1)[:k]
+    return idx[np.argsort(-sims[idx])]
+
+
+def _simple_keyword_score(query_tokens: List[str], doc_index: int) -> float:
     """
     Fallback scoring when BioBERT is not available:
     simple keyword overlap between query tokens and document text.
     """
-    text_lower = text.lower()
+    hits = _KB_KEYWORD_HITS[doc_index] if _KB_KEYWORD_HITS else frozenset()
+    text_lower = _KB_LOWER[doc_index]
     score = 0
     for tok in query_tokens:
-        if tok and tok.lower() in text_lower:
+        if not tok:
+            continue
+        tok = tok.lower()
+        if tok in _KEYWORD_VOCAB:
+            score += tok in hits
+        elif tok in text_lower:
             score += 1
     return float(score)
 
 
+def _keyword_scores(query_tokens: List[str]) -> List[Tuple[float, Dict[str, Any]]]:
+    return [
+        (_simple_keyword_score(query_tokens, i), doc)
+        for i, doc in enumerate(_KB_DOCS)
+    ]
+
+
 def get_relevant_snippets(
     symptoms: List[str],
     primary_diagnosis: str,
@@ -139,26 +395,27 @@ def get_relevant_snippets(
 
     # Try loading BioBERT from local cache once
     if not _BIOBERT_AVAILABLE and _BIOBERT_ERROR is None:
-        _try_load_biobert()
+        with _INIT_LOCK:
+            if not _BIOBERT_AVAILABLE and _BIOBERT_ERROR is None:
+                _try_load_biobert()
 
     scores: List[Tuple[float, Dict[str, Any]]] = []
 
     if _BIOBERT_AVAILABLE:
         # Use BioBERT embeddings
         try:
-            query_vec = _encode_text(query)
-            doc_vectors: List[torch.Tensor] = []
-
-            for doc in _KB_DOCS:
-                content = str(doc.get("content") or doc.get("text") or "")
-                title = str(doc.get("title") or "")
-                combined = f"{title}. {content}"
-                vec = _encode_text(combined)
-                doc_vectors.append(vec)
-
-            for doc, vec in zip(_KB_DOCS, doc_vectors):
-                sim = _cosine_similarity(query_vec, vec)
-                scores.append((sim, doc))
+            if _DOC_MATRIX is None:
+                with _INIT_LOCK:
+                    if _DOC_MATRIX is None:
+                        _precompute_doc_embeddings()
+
+            # Rows of _DOC_MATRIX are already unit-length, so one mat-vec
+            # product gives the cosine similarity to every document.
+            qn = F.normalize(_encode_text(query), dim=0)
+            sims = (_DOC_MATRIX @ qn).numpy()
+
+            for idx in _top_k_indices(sims, top_k):
+                scores.append((float(sims[idx]), _KB_DOCS[idx]))
         except Exception as e:
             # If anything goes wrong, fall back to keyword matching
             print(
@@ -166,22 +423,10 @@ def get_relevant_snippets(
                 "falling back to keyword-based scoring:",
                 repr(e),
             )
-            query_tokens = symptoms + [primary_diagnosis]
-            for doc in _KB_DOCS:
-                content = str(doc.get("content") or doc.get("text") or "")
-                title = str(doc.get("title") or "")
-                combined = f"{title}. {content}"
-                sim = _simple_keyword_score(query_tokens, combined)
-                scores.append((sim, doc))
+            scores = _keyword_scores(symptoms + [primary_diagnosis])
     else:
         # No BioBERT: keyword overlap only
-        query_tokens = symptoms + [primary_diagnosis]
-        for doc in _KB_DOCS:
-            content = str(doc.get("content") or doc.get("text") or "")
-            title = str(doc.get("title") or "")
-            combined = f"{title}. {content}"
-            sim = _simple_keyword_score(query_tokens, combined)
-            scores.append((sim, doc))
+        scores = _keyword_scores(symptoms + [primary_diagnosis])
 
     # Sort by score descending, filter by min_score
     scores.sort(key=lambda x: x[0], reverse=True)
@@ -0,0 +1,61 @@
+# ml/export_onnx_translators.py
+"""
+One-off conversion of the OPUS-MT translators to INT8 ONNX models.
+
+Run this once while online (after `pip install optimum[onnxruntime]`):
+
+    python export_onnx_translators.py
+
+For every language pair in hf_translator.MODEL_NAMES it exports the
+Hugging Face model to ONNX, applies dynamic INT8 quantization to the
+encoder/decoder graphs and writes the result (plus tokenizer files) to
+ml/models/<model-name>/. hf_translator picks these up automatically and
+falls back to the PyTorch model for any pair that has not been converted.
+"""
+
+from __future__ import annotations
+
+import shutil
+import tempfile
+from pathlib import Path
+
+from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from transformers import AutoTokenizer
+
+from hf_translator import MODEL_NAMES, ONNX_FILE_NAMES, onnx_model_dir
+
+
+def export_model(model_name: str, out_dir: Path) -> None:
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"[export] Exporting {model_name} to ONNX...")
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+        model.save_pretrained(tmp)
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for onnx_file in sorted(Path(tmp).glob("*.onnx")):
+            print(f"[export]   Quantizing {onnx_file.name} to INT8...")
+            quantizer = ORTQuantizer.from_pretrained(tmp, file_name=onnx_file.name)
+            quantizer.quantize(save_dir=out_dir, quantization_config=qconfig)
+
+        generation_config = Path(tmp) / "generation_config.json"
+        if generation_config.exists():
+            shutil.copy(generation_config, out_dir / generation_config.name)
+
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(out_dir)
+
+    missing = [f for f in ONNX_FILE_NAMES.values() if not (out_dir / f).exists()]
+    if missing:
+        raise RuntimeError(f"Export of {model_name} is missing files: {missing}")
+    print(f"[export] Wrote {out_dir}")
+
+
+def main() -> None:
+    for model_name in MODEL_NAMES.values():
+        export_model(model_name, onnx_model_dir(model_name))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 # ml/hf_translator.py
 
-from typing import Tuple
-from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from contextlib import nullcontext
+from pathlib import Path
+import os
+import threading
 
 import torch
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
@@ -21,27 +24,153 @@ MODEL_NAMES = {
     ("en", "bn"): "Helsinki-NLP/opus-mt-en-bn",
 }
 
+# Set MEDASSIST_CPU_BF16=1 to run the PyTorch translators in BF16 on CPUs with
+# native AVX-512 BF16 support (off by default: outputs can differ from FP32)
+_CPU_BF16 = os.environ.get("MEDASSIST_CPU_BF16") == "1"
+
+# Loaded (tokenizer, model, device, dtype) per language pair. Translation runs
+# on many threadpool threads (plus the startup preload), so the first load of
+# a pair is serialised by its own lock; other pairs can load in parallel.
+_LOADED: Dict[Tuple[str, str], tuple] = {}
+_LOAD_LOCKS = {key: threading.Lock() for key in MODEL_NAMES}
+
+# INT8 ONNX exports written by export_onnx_translators.py (one folder per model)
+ONNX_MODELS_DIR = Path(__file__).resolve().parent / "models"
+
+ONNX_FILE_NAMES = {
+    "encoder_file_name": "encoder_model_quantized.onnx",
+    "decoder_file_name": "decoder_model_quantized.onnx",
+    "decoder_with_past_file_name": "decoder_with_past_model_quantized.onnx",
+}
+
+
+def onnx_model_dir(model_name: str) -> Path:
+    return ONNX_MODELS_DIR / model_name.split("/")[-1]
+
+
+def _load_onnx_model(model_name: str):
+    """
+    Returns (tokenizer, ORT model) for an exported INT8 ONNX model,
+    or None if this pair has not been converted / onnxruntime is missing.
+    """
+    path = onnx_model_dir(model_name)
+    if not all((path / f).exists() for f in ONNX_FILE_NAMES.values()):
+        return None
+
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError:
+        print("[hf_translator] optimum[onnxruntime] not installed; using PyTorch.")
+        return None
+
+    tokenizer = AutoTokenizer.from_pretrained(
+        path, local_files_only=True, use_fast=True
+    )
+    model = ORTModelForSeq2SeqLM.from_pretrained(
+        path, local_files_only=True, **ONNX_FILE_NAMES
+    )
+    return tokenizer, model
+
+
+# (max input tokens, num_beams, max_new_tokens): short UI labels like
+# "fever" don't need a wide beam; only long snippet bodies get 4 beams.
+_GENERATION_TIERS = (
+    (4, 1, 16),
+    (16, 2, 48),
+    (None, 4, 128),
+)
+
+
+def _generation_settings(n_input_tokens: int) -> Tuple[int, int]:
+    """Returns (num_beams, max_new_tokens) for an input of this length."""
+    for limit, num_beams, max_new_tokens in _GENERATION_TIERS:
+        if limit is None or n_input_tokens <= limit:
+            return num_beams, max_new_tokens
+    raise AssertionError("unreachable")
+
+
+def _use_fused_attention(model):
+    """
+    Fused scaled-dot-product attention for the PyTorch translators. Recent
+    transformers already load Marian with SDPA; on older stacks fall back to
+    optimum's BetterTransformer. Any failure just keeps the model as is.
+    """
+    if getattr(model.config, "_attn_implementation", None) == "sdpa":
+        return model
+    try:
+        from optimum.bettertransformer import BetterTransformer
+
+        return BetterTransformer.transform(model)
+    except Exception as e:
+        print("[hf_translator] BetterTransformer not applied:", repr(e))
+        return model
+
+
+def _pick_dtype(device: torch.device) -> torch.dtype:
+    """
+    FP16 on GPU, BF16 on CPUs with native AVX-512 BF16 support when
+    MEDASSIST_CPU_BF16=1, else FP32.
+    """
+    if device.type == "cuda":
+        return torch.float16
+    if not _CPU_BF16:
+        return torch.float32
+    bf16_check = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+    if bf16_check is not None and bf16_check():
+        return torch.bfloat16
+    return torch.float32
+
 
-@lru_cache(maxsize=16)
 def _load_model(
     src_lang: str, tgt_lang: str
-) -> Tuple[AutoTokenizer, AutoModelForSeq2SeqLM, torch.device]:
+) -> Tuple[AutoTokenizer, AutoModelForSeq2SeqLM, torch.device, Optional[torch.dtype]]:
     """
     Lazy-load a translation model the first time we need a given language pair.
-    The model is cached in memory afterwards.
-
-    IMPORTANT: local_files_only=True makes this offline-friendly.
-    If the model has never been downloaded while online, this will raise
-    and translate_text will simply return the original text.
+    The model is cached in memory afterwards; concurrent first callers wait
+    for a single load instead of each loading their own copy.
     """
     key = (src_lang, tgt_lang)
     if key not in MODEL_NAMES:
         raise ValueError(f"No translation model for {src_lang} -> {tgt_lang}")
 
-    model_name = MODEL_NAMES[key]
+    loaded = _LOADED.get(key)
+    if loaded is None:
+        with _LOAD_LOCKS[key]:
+            loaded = _LOADED.get(key)
+            if loaded is None:
+                loaded = _LOADED[key] = _load_model_uncached(src_lang, tgt_lang)
+    return loaded
+
+
+def _load_model_uncached(
+    src_lang: str, tgt_lang: str
+) -> Tuple[AutoTokenizer, AutoModelForSeq2SeqLM, torch.device, Optional[torch.dtype]]:
+    """
+    Loads the model for a language pair (see _load_model for the cached entry point).
+
+    Prefers the INT8 ONNX Runtime export under models/ when present
+    (see export_onnx_translators.py), otherwise the PyTorch model in reduced
+    precision where the hardware supports it. The returned dtype is None for
+    ONNX models (no autocast).
+
+    IMPORTANT: local_files_only=True makes this offline-friendly.
+    If the model has never been downloaded while online, this will raise
+    and translate_text will simply return the original text.
+    """
+    model_name = MODEL_NAMES[(src_lang, tgt_lang)]
     print(f"[hf_translator] Loading model: {model_name} ({src_lang} -> {tgt_lang})")
 
-    tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=True)
+    onnx = _load_onnx_model(model_name)
+    if onnx is not None:
+        print(f"[hf_translator] Using INT8 ONNX export for {model_name}")
+        tokenizer, model = onnx
+        return tokenizer, model, torch.device("cpu"), None
+
+    # Rust tokenizer where the model has one (Marian/OPUS-MT falls back to
+    # its SentencePiece tokenizer, which has no fast variant)
+    tokenizer = AutoTokenizer.from_pretrained(
+        model_name, local_files_only=True, use_fast=True
+    )
     model = AutoModelForSeq2SeqLM.from_pretrained(
         model_name, local_files_only=True
     )
@@ -49,45 +178,91 @@ def _load_model(
     # CPU is fine for your use-case
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     model.to(device)
+    dtype = _pick_dtype(device)
+    model = model.to(dtype)
     model.eval()
+    model = _use_fused_attention(model)
+    # Reuse decoder key/values between steps (OPUS-MT default, but be explicit)
+    model.config.use_cache = True
 
-    return tokenizer, model, device
+    return tokenizer, model, device, dtype
 
 
-def translate_text(text: str, src_lang: str, tgt_lang: str) -> str:
+def translate_batch(texts: List[str], src_lang: str, tgt_lang: str) -> List[str]:
     """
-    Translate text from src_lang to tgt_lang using a Hugging Face model.
-    Falls back to the original text on any error.
+    Translate several texts from src_lang to tgt_lang, batching them into
+    one padded generate() call per length tier (see _GENERATION_TIERS).
+    Returns a list aligned with `texts`.
+    Falls back to the original texts on any error.
     """
-    text = text.strip()
-    if not text:
-        return text
+    texts = [t.strip() for t in texts]
 
-    # If languages are same or unsupported, just return the text
+    # If languages are same or unsupported, just return the texts
     if src_lang == tgt_lang:
-        return text
+        return texts
     if src_lang not in SUPPORTED_LANGS or tgt_lang not in SUPPORTED_LANGS:
-        return text
+        return texts
+
+    todo = [i for i, t in enumerate(texts) if t]
+    if not todo:
+        return texts
 
     try:
-        tokenizer, model, device = _load_model(src_lang, tgt_lang)
-
-        inputs = tokenizer(
-            text, return_tensors="pt", padding=True, truncation=True
-        ).to(device)
-        with torch.no_grad():
-            output_tokens = model.generate(
-                **inputs,
-                max_new_tokens=128,
-                num_beams=4,
-            )
-        result = tokenizer.batch_decode(
-            output_tokens, skip_special_tokens=True
+        tokenizer, model, device, dtype = _load_model(src_lang, tgt_lang)
+
+        # Group texts by generation settings so each group shares one
+        # padded generate() call with a beam width suited to its length.
+        lengths = [
+            len(ids)
+            for ids in tokenizer([texts[i] for i in todo], truncation=True)[
+                "input_ids"
+            ]
+        ]
+        groups: Dict[Tuple[int, int], List[int]] = {}
+        for i, n_in in zip(todo, lengths):
+            groups.setdefault(_generation_settings(n_in), []).append(i)
+
+        autocast = (
+            torch.autocast(device.type, dtype=dtype)
+            if dtype not in (None, torch.float32)
+            else nullcontext()
         )
-        return result[0].strip()
+        result = list(texts)
+        for (num_beams, max_new_tokens), idxs in groups.items():
+            inputs = tokenizer(
+                [texts[i] for i in idxs],
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+            ).to(device)
+            gen_kwargs = {
+                "max_new_tokens": max_new_tokens,
+                "num_beams": num_beams,
+                "no_repeat_ngram_size": 0,
+                "use_cache": True,
+            }
+            if num_beams > 1:
+                gen_kwargs.update(early_stopping=True, length_penalty=1.0)
+
+            with torch.inference_mode(), autocast:
+                output_tokens = model.generate(**inputs, **gen_kwargs)
+            decoded = tokenizer.batch_decode(
+                output_tokens, skip_special_tokens=True
+            )
+            for i, translated in zip(idxs, decoded):
+                result[i] = translated.strip()
+        return result
     except Exception as e:
         print(
             f"[hf_translator] Translation error ({src_lang}->{tgt_lang}):",
             repr(e),
         )
-        return text
+        return texts
+
+
+def translate_text(text: str, src_lang: str, tgt_lang: str) -> str:
+    """
+    Translate text from src_lang to tgt_lang using a Hugging Face model.
+    Falls back to the original text on any error.
+    """
+    return translate_batch([text], src_lang, tgt_lang)[0]